@@ -0,0 +1,409 @@
+#dataset环境下运行，在项目根目录执行: python pipeline.py [pipeline_config.json]
+"""
+流式流水线：convert → render → augment → relocate
+
+各阶段以生成器 + 有界队列相连，样本只在内存中流转，
+仅写出最终的 images/ 与 jsonl（以及可选的调试检查点）。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from origin_data.convert import (
+    FIXED_USER_PROMPT, IMAGE_COLUMN, PARQUET_PATH, SAMPLE_INTERVAL, TARGET_SAMPLES, TEXT_COLUMN,
+    TOTAL_RECORDS, build_record, compute_sample_points, is_valid_image, is_valid_latex,
+)
+from transfer_data.generate_formula_images import render_formula_png
+from transfer_data.latex_stats import LatexStatsIndex
+from worked_data.enhance_image import enhance_formula_png, select_indices_to_augment
+from worked_data.modify_image_paths import new_prefix as NEW_PREFIX, old_prefix as OLD_PREFIX, rewrite_image_paths
+
+# ========== 默认配置（可被配置文件覆盖） ==========
+DEFAULT_CONFIG_PATH = "pipeline_config.json"
+DEFAULT_CONFIG = {
+    "parquet_path": PARQUET_PATH,
+    "text_column": TEXT_COLUMN,
+    "image_column": IMAGE_COLUMN,
+    "user_prompt": FIXED_USER_PROMPT,
+    "total_records": TOTAL_RECORDS,
+    "sample_interval": SAMPLE_INTERVAL,
+    "target_samples": TARGET_SAMPLES,
+    "num_to_augment": 120,  # 增强数量上限：按采样序号选择，被过滤的样本不会补选
+    "output_dir": "./worked_data",
+    "output_jsonl": "add_train.jsonl",
+    "stats_file": "latex_stats.npz",  # 写在output_dir下的标注公式统计索引，为null时不统计
+    "old_prefix": OLD_PREFIX,
+    "new_prefix": NEW_PREFIX,
+    "debug_dir": None,     # 设置后在该目录下为每个阶段写出检查点
+    "queue_size": 64,      # 阶段之间有界队列的容量
+    "stats_batch_size": 256,
+    "stages": {
+        "convert": {"workers": 2, "processes": False},
+        "render": {"workers": 4, "processes": True},
+        "augment": {"workers": 2, "processes": False},
+    },
+}
+# ===========================
+
+_DONE = object()
+_POLL_INTERVAL = 0.1
+
+
+def _put(q, item, stop):
+    """
+    向队列放入元素，流水线停止时放弃并返回False
+    """
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    """
+    从队列取出元素，流水线停止时返回None
+    """
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+    return None
+
+
+def load_config(config_path=None):
+    """
+    读取配置文件并与默认配置合并
+    """
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if config_path:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            user_config = json.load(f)
+        stages = user_config.pop("stages", {})
+        config.update(user_config)
+        for name, stage_config in stages.items():
+            config["stages"].setdefault(name, {}).update(stage_config)
+    return config
+
+
+def _init_worker():
+    """
+    子进程初始化：重新设置随机种子，避免各进程产生相同的增强角度
+    """
+    random.seed()
+    np.random.seed()
+
+
+# ========== 阶段函数：接收一个样本，返回处理后的样本或None（丢弃） ==========
+
+def convert_sample(sample, user_prompt=FIXED_USER_PROMPT):
+    """
+    校验LaTeX与原始图片，并构建标注记录
+    """
+    if not is_valid_latex(sample["latex"]):
+        print(f"⚠️ 第 {sample['original_index']} 条记录 LaTeX 格式无效，跳过采样")
+        return None
+    if not sample["image_bytes"]:
+        print(f"⚠️ 第 {sample['original_index']} 条记录没有图片数据")
+        return None
+    # 与convert.py一致：原始图片无法解码的样本同样丢弃
+    if not is_valid_image(sample["image_bytes"]):
+        print(f"❌ 第 {sample['original_index']} 条记录图片无法解码，跳过采样")
+        return None
+
+    # 使用采样索引命名文件
+    image_filename = f"images/image_{sample['index']:03d}.png"
+    sample["record"] = build_record(sample["latex"], image_filename, user_prompt)
+    return sample
+
+
+def render_sample(sample):
+    """
+    渲染公式图片，替换原始图片字节
+    """
+    png_bytes = render_formula_png(sample["latex"])
+    if png_bytes is None:
+        print(f"❌ 生成失败: 公式 {sample['index']}")
+        return None
+    sample["image_bytes"] = png_bytes
+    return sample
+
+
+def augment_sample(sample, indices_to_augment=frozenset()):
+    """
+    对选中的样本应用旋转增强
+    """
+    sample["image_bytes"] = enhance_formula_png(sample["image_bytes"], sample["index"] in indices_to_augment)
+    return sample
+
+
+# ========== 流水线框架 ==========
+
+class _Checkpoint:
+    """
+    调试检查点：写出某个阶段的图片与标注记录
+    """
+
+    def __init__(self, debug_dir, stage_name):
+        self.stage_dir = os.path.join(debug_dir, stage_name)
+        os.makedirs(os.path.join(self.stage_dir, "images"), exist_ok=True)
+        self.lock = threading.Lock()
+        self.jsonl = open(os.path.join(self.stage_dir, "output.jsonl"), 'w', encoding='utf-8')
+
+    def write(self, sample):
+        image_filename = sample["record"]["images"][0]
+        with open(os.path.join(self.stage_dir, image_filename), 'wb') as f:
+            f.write(sample["image_bytes"])
+        with self.lock:
+            self.jsonl.write(json.dumps(sample["record"], ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.jsonl.close()
+
+
+def run_stage(name, func, items, workers=1, processes=False, queue_size=64, debug_dir=None, stop=None):
+    """
+    将一个阶段连接为生成器：
+    从上游生成器items读取 (序号, 样本)，由workers个工作线程并发执行func，
+    通过有界队列向下游产出 (序号, 样本)；样本为None表示已被丢弃
+    processes为True时，工作线程把func分派到同等大小的进程池中执行
+    stop为各阶段共享的停止标志：本阶段被提前关闭时设置它，所有阶段的线程随之退出
+    """
+    stop = stop if stop is not None else threading.Event()
+    in_queue = queue.Queue(maxsize=queue_size)
+    out_queue = queue.Queue(maxsize=queue_size)
+    # 使用spawn启动子进程：此时其他阶段的线程正在运行，fork可能复制被占用的锁导致子进程死锁
+    executor = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker,
+    ) if processes else None
+    checkpoint = _Checkpoint(debug_dir, name) if debug_dir else None
+    errors = []
+
+    def feed():
+        try:
+            for item in items:
+                if not _put(in_queue, item, stop):
+                    break
+        except Exception as e:
+            if not stop.is_set():
+                errors.append(e)
+        finally:
+            # 提前停止时关闭上游生成器，使其释放线程与进程池
+            if hasattr(items, "close"):
+                items.close()
+            for _ in range(workers):
+                _put(in_queue, _DONE, stop)
+
+    def work():
+        while True:
+            item = _get(in_queue, stop)
+            if item is None:
+                return
+            if item is _DONE:
+                _put(out_queue, _DONE, stop)
+                return
+            seq, sample = item
+            if sample is not None:
+                try:
+                    sample = executor.submit(func, sample).result() if executor else func(sample)
+                except Exception as e:
+                    # 阶段正在停止时不再报告逐样本错误
+                    if stop.is_set():
+                        return
+                    print(f"❌ [{name}] 处理样本 {seq} 时出错: {e}")
+                    sample = None
+                # 检查点仅用于调试，写出失败不影响样本
+                if sample is not None and checkpoint:
+                    try:
+                        checkpoint.write(sample)
+                    except Exception as e:
+                        if not stop.is_set():
+                            print(f"⚠️ [{name}] 写出样本 {seq} 的检查点失败: {e}")
+            if not _put(out_queue, (seq, sample), stop):
+                return
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    threads += [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    completed = False
+    try:
+        finished = 0
+        while finished < workers:
+            item = _get(out_queue, stop)
+            if item is None:
+                # 其他阶段已中止流水线
+                break
+            if item is _DONE:
+                finished += 1
+                continue
+            yield item
+        completed = finished == workers
+    finally:
+        if not completed:
+            stop.set()
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        if checkpoint:
+            checkpoint.close()
+
+    # 上游出错时向下游抛出
+    if errors:
+        raise errors[0]
+
+
+def in_order(results):
+    """
+    按序号重新排列各阶段并发产出的结果，跳过被丢弃的样本
+    """
+    pending = {}
+    next_seq = 0
+    for seq, sample in results:
+        pending[seq] = sample
+        while next_seq in pending:
+            sample = pending.pop(next_seq)
+            next_seq += 1
+            if sample is not None:
+                yield sample
+
+
+def read_samples(df, sample_points, text_column, image_column):
+    """
+    从Parquet数据中按采样点产出原始样本
+    """
+    for sample_idx, original_idx in enumerate(sample_points):
+        row = df.iloc[original_idx]
+        image_dict = getattr(row, image_column)
+        sample = {
+            "index": sample_idx,
+            "original_index": original_idx,
+            "latex": getattr(row, text_column),
+            "image_bytes": image_dict.get('bytes', b'') if isinstance(image_dict, dict) else b'',
+        }
+        yield sample_idx, sample
+
+
+def run_pipeline(config):
+    output_images_dir = os.path.join(config["output_dir"], "images")
+    output_jsonl_path = os.path.join(config["output_dir"], config["output_jsonl"])
+    os.makedirs(output_images_dir, exist_ok=True)
+    stats_index = LatexStatsIndex() if config["stats_file"] else None
+    pending_formulas = []
+
+    # 读取Parquet文件
+    print("正在读取Parquet文件...")
+    df = pd.read_parquet(config["parquet_path"])
+    print(f"共找到 {len(df)} 条记录")
+
+    # ========== 采样逻辑 ==========
+    sample_points = compute_sample_points(
+        len(df), config["total_records"], config["sample_interval"], config["target_samples"])
+    print(f"采样点: {sample_points[:10]}... (共{len(sample_points)}个)")
+
+    # 按采样序号等间隔选择要增强的样本
+    # 流式处理时无法预知最终成功数量，被过滤的样本不补选，因此num_to_augment是上限
+    indices_to_augment = frozenset(select_indices_to_augment(len(sample_points), config["num_to_augment"]))
+
+    # ========== 连接各阶段 ==========
+    stage_funcs = [
+        ("convert", partial(convert_sample, user_prompt=config["user_prompt"])),
+        ("render", render_sample),
+        ("augment", partial(augment_sample, indices_to_augment=indices_to_augment)),
+    ]
+    stop = threading.Event()
+    stream = read_samples(df, sample_points, config["text_column"], config["image_column"])
+    for name, func in stage_funcs:
+        stage_config = config["stages"].get(name, {})
+        stream = run_stage(
+            name, func, stream,
+            workers=stage_config.get("workers", 1),
+            processes=stage_config.get("processes", False),
+            queue_size=config["queue_size"],
+            debug_dir=config["debug_dir"],
+            stop=stop,
+        )
+
+    # ========== 输出：写出图片，并在写出时替换路径前缀 ==========
+    success_count = 0
+    augmented_count = 0
+    ordered = in_order(stream)
+    try:
+        with open(output_jsonl_path, 'w', encoding='utf-8') as f:
+            for sample in ordered:
+                record = sample["record"]
+                image_filename = os.path.basename(record["images"][0])
+                with open(os.path.join(output_images_dir, image_filename), 'wb') as image_file:
+                    image_file.write(sample["image_bytes"])
+
+                rewrite_image_paths(record, config["old_prefix"], config["new_prefix"])
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+                # 按批增量更新语料统计，统计的是写入jsonl的标注公式
+                if stats_index is not None:
+                    pending_formulas.append(sample["latex"])
+                    if len(pending_formulas) >= config["stats_batch_size"]:
+                        stats_index.update(pending_formulas)
+                        pending_formulas = []
+
+                success_count += 1
+                if sample["index"] in indices_to_augment:
+                    augmented_count += 1
+
+                # 显示进度
+                if success_count % 20 == 0:
+                    print(f"📊 进度: {success_count} (已增强: {augmented_count})")
+    finally:
+        # 写出失败时停止所有阶段，避免后台线程继续处理并输出误报
+        stop.set()
+        ordered.close()
+        stream.close()
+
+    if stats_index is not None:
+        stats_index.update(pending_formulas)
+        stats_path = os.path.join(config["output_dir"], config["stats_file"])
+        stats_index.save(stats_path)
+
+    print("\n" + "="*50)
+    print("✅ 处理完成！")
+    print(f"📊 总共采样: {len(sample_points)} 条记录")
+    print(f"📊 成功生成: {success_count} 张图片")
+    print(f"📊 增强操作: {augmented_count} 张")
+    print(f"📁 图片已保存至: {os.path.abspath(output_images_dir)}")
+    print(f"📄 JSONL 文件已生成: {os.path.abspath(output_jsonl_path)}")
+    if stats_index is not None:
+        print(f"📄 语料统计索引已生成: {os.path.abspath(stats_path)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式公式数据集流水线")
+    parser.add_argument("config", nargs="?", help=f"配置文件路径（默认 {DEFAULT_CONFIG_PATH}）")
+    args = parser.parse_args()
+
+    if args.config is not None:
+        # 显式指定的配置文件必须存在，避免用默认配置覆盖输出
+        if not os.path.exists(args.config):
+            parser.error(f"配置文件不存在: {args.config}")
+        config_path = args.config
+    elif os.path.exists(DEFAULT_CONFIG_PATH):
+        config_path = DEFAULT_CONFIG_PATH
+    else:
+        print(f"⚠️ 配置文件不存在: {DEFAULT_CONFIG_PATH}，使用默认配置")
+        config_path = None
+    run_pipeline(load_config(config_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
+import io
 import json
 import matplotlib
 matplotlib.use('Agg')  # 添加这行，确保在无GUI环境下也能生成图片
-import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import os
 import re
 from matplotlib import rcParams
@@ -101,9 +103,9 @@ def validate_latex_syntax(formula_text):
     except Exception:
         return False
 
-def generate_formula_image(formula_text, output_path, index):
+def normalize_formula(formula_text):
     """
-    使用matplotlib生成公式图片
+    规范化公式文本：修复LaTeX语法并清理空白
     """
     # 修复LaTeX语法
     formula_text = fix_latex_syntax(formula_text)
@@ -112,7 +114,14 @@ def generate_formula_image(formula_text, output_path, index):
     formula_text = formula_text.strip().rstrip(',')
     
     # 处理多行公式和多余空格
-    formula_text = ' '.join(formula_text.split())
+    return ' '.join(formula_text.split())
+
+def render_formula_png(formula_text):
+    """
+    使用matplotlib将公式渲染为透明背景的PNG字节，失败时返回None
+    不经过pyplot全局状态，可在多个线程中并发调用
+    """
+    formula_text = normalize_formula(formula_text)
     
     # 验证LaTeX语法
     if not validate_latex_syntax(formula_text):
@@ -120,7 +129,9 @@ def generate_formula_image(formula_text, output_path, index):
         return None
     
     # 创建图形和轴
-    fig, ax = plt.subplots(figsize=(5, 3))  # 增加一些宽度和高度
+    fig = Figure(figsize=(5, 3))  # 增加一些宽度和高度
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
     
     # 移除坐标轴
     ax.set_axis_off()
@@ -132,22 +143,35 @@ def generate_formula_image(formula_text, output_path, index):
     try:
         ax.text(0.5, 0.5, display_text, fontsize=20, ha='center', va='center')
     except Exception as e:
-        print(f"❌ LaTeX渲染错误，使用纯文本显示: {str(e)[:50]}...")
-        # 如果LaTeX渲染失败，尝试显示为普通文本
-        ax.text(0.5, 0.5, formula_text, fontsize=16, ha='center', va='center')
+        print(f"❌ LaTeX渲染错误: {str(e)[:50]}...")
         # 返回None表示渲染失败
-        plt.close(fig)
         return None
     
-    # 保存图片，设置透明背景
+    # 渲染到内存，设置透明背景
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format='png', dpi=300, bbox_inches='tight', pad_inches=0.1, transparent=True)
+    except Exception as e:
+        print(f"❌ 渲染图片失败: {str(e)[:50]}...")
+        return None
+    return buffer.getvalue()
+
+def generate_formula_image(formula_text, output_path, index):
+    """
+    使用matplotlib生成公式图片
+    """
+    png_bytes = render_formula_png(formula_text)
+    if png_bytes is None:
+        return None
+    
+    # 保存图片
     image_path = os.path.join(output_path, f'image_{index:03d}.png')
     try:
-        plt.savefig(image_path, dpi=300, bbox_inches='tight', pad_inches=0.1, transparent=True)
-        plt.close(fig)
+        with open(image_path, 'wb') as f:
+            f.write(png_bytes)
         return image_path
     except Exception as e:
         print(f"❌ 保存图片失败 {image_path}: {e}")
-        plt.close(fig)
         return None
 
 def create_validated_jsonl(original_jsonl_path, output_jsonl_path, valid_indices):
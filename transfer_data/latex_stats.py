@@ -0,0 +1,274 @@
+#dataset环境下运行
+"""
+LaTeX token 词表与语料统计索引
+
+统计内容：token词表及出现次数、包含各token的公式数（命令覆盖率）、公式长度（token数）直方图。
+索引可增量更新，也可跨分片/进程合并，以 NumPy 数组 + 词表的形式保存为 .npz 文件，
+百万级语料的统计只需合并各分片的索引，无需重新扫描 jsonl。
+
+用法（在项目根目录执行）:
+    python transfer_data/latex_stats.py build transfer_data/best_output.jsonl -o stats.npz
+    python transfer_data/latex_stats.py merge shard_0.npz shard_1.npz -o stats.npz
+    python transfer_data/latex_stats.py show stats.npz
+"""
+import argparse
+import re
+
+import numpy as np
+
+try:
+    from transfer_data.generate_formula_images import extract_content_annotations
+except ModuleNotFoundError as e:
+    if e.name != 'transfer_data':
+        raise
+    # 以脚本方式运行时 transfer_data/ 在 sys.path 上
+    from generate_formula_images import extract_content_annotations
+
+# 命令（\frac）、转义字符（\{ \\）或单个非空白字符
+TOKEN_PATTERN = re.compile(r'\\[a-zA-Z]+|\\.|\S')
+
+
+def tokenize_latex(formula_text):
+    """
+    将LaTeX公式切分为token列表
+    """
+    return TOKEN_PATTERN.findall(formula_text)
+
+
+def is_command(token):
+    """
+    判断token是否为LaTeX命令，如 \\frac
+    """
+    return len(token) > 1 and token[0] == '\\' and token[1:].isalpha()
+
+
+def _grow(array, size):
+    """
+    按需扩容数组（容量翻倍），新增部分填0
+    """
+    if len(array) >= size:
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class LatexStatsIndex:
+    """
+    可增量更新、可合并的LaTeX语料统计索引
+    """
+
+    def __init__(self):
+        self.vocab = {}      # token -> id
+        self.tokens = []     # id -> token
+        self.num_formulas = 0
+        # 以下数组的容量可能大于词表大小，只有前 len(self.tokens) 项有效
+        self._token_counts = np.zeros(0, dtype=np.int64)    # token出现次数
+        self._formula_counts = np.zeros(0, dtype=np.int64)  # 包含该token的公式数
+        self._length_hist = np.zeros(0, dtype=np.int64)     # 下标为公式token数
+
+    def __len__(self):
+        return len(self.tokens)
+
+    @property
+    def token_counts(self):
+        return self._token_counts[:len(self.tokens)]
+
+    @property
+    def formula_counts(self):
+        return self._formula_counts[:len(self.tokens)]
+
+    @property
+    def length_hist(self):
+        nonzero = np.flatnonzero(self._length_hist)
+        return self._length_hist[:nonzero[-1] + 1] if len(nonzero) else self._length_hist[:0]
+
+    def _token_ids(self, tokens):
+        ids = []
+        for token in tokens:
+            idx = self.vocab.get(token)
+            if idx is None:
+                idx = len(self.tokens)
+                self.vocab[token] = idx
+                self.tokens.append(token)
+            ids.append(idx)
+        return ids
+
+    def update(self, formulas):
+        """
+        用一批公式增量更新索引，也接受单个字符串
+        """
+        if isinstance(formulas, str):
+            formulas = [formulas]
+
+        all_ids = []
+        unique_ids = []
+        lengths = []
+        for formula_text in formulas:
+            ids = self._token_ids(tokenize_latex(formula_text))
+            all_ids.extend(ids)
+            unique_ids.extend(set(ids))
+            lengths.append(len(ids))
+        if not lengths:
+            return self
+
+        size = len(self.tokens)
+        self._token_counts = _grow(self._token_counts, size)
+        self._formula_counts = _grow(self._formula_counts, size)
+        self._token_counts[:size] += np.bincount(np.asarray(all_ids, dtype=np.intp), minlength=size)
+        self._formula_counts[:size] += np.bincount(np.asarray(unique_ids, dtype=np.intp), minlength=size)
+
+        hist = np.bincount(np.asarray(lengths, dtype=np.intp))
+        self._length_hist = _grow(self._length_hist, len(hist))
+        self._length_hist[:len(hist)] += hist
+
+        self.num_formulas += len(lengths)
+        return self
+
+    def merge(self, other):
+        """
+        将另一个索引（其他分片或进程的统计）合并到当前索引
+        """
+        mapping = np.asarray(self._token_ids(other.tokens), dtype=np.intp)
+        size = len(self.tokens)
+        self._token_counts = _grow(self._token_counts, size)
+        self._formula_counts = _grow(self._formula_counts, size)
+        self._token_counts[mapping] += other.token_counts
+        self._formula_counts[mapping] += other.formula_counts
+
+        hist = other.length_hist
+        self._length_hist = _grow(self._length_hist, len(hist))
+        self._length_hist[:len(hist)] += hist
+
+        self.num_formulas += other.num_formulas
+        return self
+
+    @classmethod
+    def merged(cls, indices):
+        """
+        合并多个索引，返回新的索引
+        """
+        result = cls()
+        for index in indices:
+            result.merge(index)
+        return result
+
+    # ========== 查询 ==========
+
+    def most_common(self, n=None, commands_only=False):
+        """
+        按出现次数降序返回 [(token, 次数), ...]
+        """
+        counts = self.token_counts
+        order = np.argsort(-counts, kind='stable')
+        result = [(self.tokens[i], int(counts[i])) for i in order
+                  if not commands_only or is_command(self.tokens[i])]
+        return result if n is None else result[:n]
+
+    def command_coverage(self):
+        """
+        返回 {命令: (出现次数, 包含该命令的公式数, 公式覆盖率)}
+        """
+        coverage = {}
+        for idx, token in enumerate(self.tokens):
+            if is_command(token):
+                formula_count = int(self._formula_counts[idx])
+                ratio = formula_count / self.num_formulas if self.num_formulas else 0.0
+                coverage[token] = (int(self._token_counts[idx]), formula_count, ratio)
+        return coverage
+
+    def mean_length(self):
+        hist = self.length_hist
+        if not self.num_formulas:
+            return 0.0
+        return float(np.dot(np.arange(len(hist)), hist) / self.num_formulas)
+
+    def length_quantile(self, q):
+        """
+        从长度直方图计算分位数（q取0~1）
+        """
+        if not self.num_formulas:
+            return 0
+        cumulative = np.cumsum(self.length_hist)
+        return int(np.searchsorted(cumulative, q * self.num_formulas))
+
+    # ========== 存储 ==========
+
+    def save(self, path):
+        """
+        保存为 .npz：词表 + 各统计数组
+        """
+        np.savez_compressed(
+            path,
+            tokens=np.array(self.tokens, dtype=str),
+            token_counts=self.token_counts,
+            formula_counts=self.formula_counts,
+            length_hist=self.length_hist,
+            num_formulas=np.int64(self.num_formulas),
+        )
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with np.load(path) as data:
+            index.tokens = data['tokens'].tolist()
+            index.vocab = {token: idx for idx, token in enumerate(index.tokens)}
+            index._token_counts = data['token_counts'].astype(np.int64)
+            index._formula_counts = data['formula_counts'].astype(np.int64)
+            index._length_hist = data['length_hist'].astype(np.int64)
+            index.num_formulas = int(data['num_formulas'])
+        return index
+
+    def print_summary(self, top=20):
+        print(f"📊 公式数: {self.num_formulas}")
+        print(f"📊 词表大小: {len(self.tokens)} (命令 {sum(is_command(t) for t in self.tokens)} 个)")
+        print(f"📊 token总数: {int(self.token_counts.sum())}")
+        print(f"📏 长度: 平均 {self.mean_length():.1f}, 中位数 {self.length_quantile(0.5)}, "
+              f"P95 {self.length_quantile(0.95)}, 最大 {max(len(self.length_hist) - 1, 0)}")
+        print(f"\n🔝 最常见的 {top} 个命令:")
+        coverage = self.command_coverage()
+        for token, count in self.most_common(top, commands_only=True):
+            print(f"  {token:<16} 次数: {count:<8} 覆盖率: {coverage[token][2] * 100:.2f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LaTeX token 词表与语料统计索引")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="从jsonl文件构建索引")
+    build_parser.add_argument("jsonl_files", nargs="+")
+    build_parser.add_argument("-o", "--output", required=True)
+
+    merge_parser = subparsers.add_parser("merge", help="合并多个索引文件")
+    merge_parser.add_argument("index_files", nargs="+")
+    merge_parser.add_argument("-o", "--output", required=True)
+
+    show_parser = subparsers.add_parser("show", help="显示索引统计")
+    show_parser.add_argument("index_file")
+    show_parser.add_argument("--top", type=int, default=20)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        # 与流水线一致，统计jsonl中的标注公式原文
+        index = LatexStatsIndex()
+        for jsonl_file in args.jsonl_files:
+            formulas = extract_content_annotations(jsonl_file)
+            index.update(formulas)
+            print(f"✅ 已统计: {jsonl_file} ({len(formulas)} 条公式)")
+        index.save(args.output)
+    elif args.command == "merge":
+        index = LatexStatsIndex.merged(LatexStatsIndex.load(path) for path in args.index_files)
+        index.save(args.output)
+        print(f"✅ 已合并 {len(args.index_files)} 个索引")
+    else:
+        index = LatexStatsIndex.load(args.index_file)
+        index.print_summary(args.top)
+        return
+
+    print(f"📄 索引已保存至: {args.output}")
+    index.print_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -91,6 +91,48 @@ def enhance_formula_image(input_path, output_path, target_height=128, apply_augm
             pass
 
 
+def enhance_formula_png(png_bytes, apply_augmentation=False):
+    """
+    在内存中处理单张PNG图像，返回处理后的PNG字节
+    """
+    # 对于未增强的图像，直接返回原始字节以保持完全相同的画质
+    if not apply_augmentation:
+        return png_bytes
+
+    try:
+        image = cv2.imdecode(np.frombuffer(png_bytes, dtype=np.uint8), cv2.IMREAD_UNCHANGED)  # 保持原图所有通道信息
+        if image is None:
+            raise ValueError("无法解码图像")
+
+        enhanced = apply_enhancements(image)
+
+        # 使用适当压缩的PNG编码以减小文件体积
+        success, encoded = cv2.imencode('.png', enhanced, [cv2.IMWRITE_PNG_COMPRESSION, 3])
+        if not success:
+            raise ValueError("无法编码图像")
+        return encoded.tobytes()
+
+    except Exception as e:
+        # 完全失败时，回退为原始图像
+        print(f"⚠️ 增强失败，回退为原始图像 -> {e}")
+        return png_bytes
+
+
+def select_indices_to_augment(total, num_to_augment):
+    """
+    等间隔选择要增强的图像索引
+    """
+    if total <= num_to_augment:
+        return set(range(total))
+
+    step = total / num_to_augment
+    indices_to_augment = set()
+    for i in range(num_to_augment):
+        idx = int(i * step)
+        indices_to_augment.add(min(idx, total - 1))
+    return indices_to_augment
+
+
 def enhance_images_in_directory(input_dir, output_dir, target_height=128, num_to_augment=40):
     """
     处理目录中的图像，按确定性方式选择指定数量的图像进行增强
@@ -111,16 +153,10 @@ def enhance_images_in_directory(input_dir, output_dir, target_height=128, num_to
     print(f"📁 找到 {len(all_images)} 张图像")
     
     # 确定要增强的图片索引（等间隔选择）
+    indices_to_augment = select_indices_to_augment(len(all_images), num_to_augment)
     if len(all_images) <= num_to_augment:
-        indices_to_augment = set(range(len(all_images)))
         print(f"⚠️ 图像总数({len(all_images)}) <= 要增强的数量({num_to_augment})，将增强所有图像")
     else:
-        # 等间隔选择索引
-        step = len(all_images) / num_to_augment
-        indices_to_augment = set()
-        for i in range(num_to_augment):
-            idx = int(i * step)
-            indices_to_augment.add(min(idx, len(all_images) - 1))
         print(f"🎯 等间隔选择 {num_to_augment} 张图像进行增强")
 
     # 处理所有图像